@@ -0,0 +1,61 @@
+"""Wall time of `pixi run build` with the full wgpu bindings and with the
+pruned ones from `gen-pruned`.
+
+Each variant regenerates the bindings, reinstalls the wgpu-mojo package so the
+build sees them, then builds main.mojo `--repeat` times; the fastest build is
+reported. The full bindings are regenerated at the end, leaving the checked-in
+files as they were.
+
+    pixi run bench-build
+"""
+
+import argparse
+import subprocess
+import time
+from pathlib import Path
+
+VARIANTS = [("full", "gen"), ("pruned", "gen-pruned")]
+
+
+def run(*cmd):
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+
+
+def timed(*cmd):
+    start = time.perf_counter()
+    run(*cmd)
+    return time.perf_counter() - start
+
+
+def cffi_lines():
+    path = Path("packages/wgpu/wgpu/_cffi.mojo")
+    return len(path.read_text().splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    try:
+        for name, gen_task in VARIANTS:
+            run("pixi", "run", gen_task)
+            package = timed("pixi", "reinstall", "wgpu-mojo")
+            build = min(
+                timed("pixi", "run", "build") for _ in range(args.repeat)
+            )
+            results.append((name, cffi_lines(), package, build))
+    finally:
+        run("pixi", "run", "gen")
+        run("pixi", "reinstall", "wgpu-mojo")
+
+    for name, lines, package, build in results:
+        print(
+            f"{name:7} _cffi.mojo {lines:5} lines, "
+            f"wgpu-mojo package {package:6.1f} s, build {build:6.1f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
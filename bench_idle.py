@@ -0,0 +1,42 @@
+"""CPU time an idle sketch burns per second of wall time, for each loop mode.
+
+The sketch (bench_idle.mojo) draws a cleared window and nothing else, so any
+CPU it uses is the cost of the loop itself. Startup is included, which is why
+each mode runs for several seconds.
+
+    pixi run bench-idle
+"""
+
+import argparse
+import resource
+import subprocess
+import time
+
+MODES = ["wait", "once", "rate", "refresh_sync"]
+
+
+def cpu_per_second(binary, mode, seconds):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    proc = subprocess.Popen([binary, mode])
+    time.sleep(seconds)
+    proc.terminate()
+    proc.wait()
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return cpu / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("binary", nargs="?", default="build/bench_idle")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        usage = cpu_per_second(args.binary, mode, args.seconds)
+        print(f"{mode:<14} {usage * 100:6.1f}% of a core")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,19 @@
 #!/bin/bash
 set -e
 
+SRC=${1:-main.mojo}
+OUT=${2:-build/main}
+
 # Build the project
-mojo build main.mojo -o build/main
+mojo build "$SRC" -o "$OUT"
 
 # Fix wgpu_native library path
-OLD_PATH=$(otool -L build/main | grep wgpu_native | awk '{print $1}' | xargs || echo "")
+OLD_PATH=$(otool -L "$OUT" | grep wgpu_native | awk '{print $1}' | xargs || echo "")
 if [ ! -z "$OLD_PATH" ]; then
-  install_name_tool -change "$OLD_PATH" @rpath/libwgpu_native.dylib build/main
+  install_name_tool -change "$OLD_PATH" @rpath/libwgpu_native.dylib "$OUT"
 fi
 
 # Add rpath
-install_name_tool -add_rpath @loader_path/../.pixi/envs/default/lib build/main 2>/dev/null || true
+install_name_tool -add_rpath @loader_path/../.pixi/envs/default/lib "$OUT" 2>/dev/null || true
 
-echo "✓ Build complete: build/main"
+echo "✓ Build complete: $OUT"
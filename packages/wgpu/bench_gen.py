@@ -0,0 +1,90 @@
+"""Time `gen_c.py` over webgpu.json and a synthetic spec N times its size.
+
+    python bench_gen.py webgpu.json --scale 10 --repeat 5 [--jobs N]
+"""
+
+import argparse
+import copy
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from gen_c import SECTIONS, GenCache, generate
+
+# Copies are renamed so the synthetic spec has no duplicate names; type
+# references inside them keep pointing at the original entries.
+RENAMED_SECTIONS = [
+    "constants",
+    "enums",
+    "bitflags",
+    "structs",
+    "objects",
+    "functions",
+    "function_types",
+]
+
+
+def scale_spec(spec: dict, scale: int) -> dict:
+    scaled = dict(spec)
+    for name in SECTIONS:
+        entries = spec.get(name, [])
+        copies = list(entries)
+        for i in range(1, scale):
+            for entry in entries:
+                entry = copy.deepcopy(entry)
+                if name in RENAMED_SECTIONS:
+                    entry["name"] = f"{entry['name']}_{i}"
+                copies.append(entry)
+        scaled[name] = copies
+    return scaled
+
+
+def bench(
+    spec_path: Path, repeat: int, jobs: int, cache_path: Optional[Path] = None
+) -> tuple[float, int]:
+    """Best of `repeat` runs; with `cache_path` every run reloads a warm cache."""
+    if cache_path:
+        cache = GenCache(cache_path)
+        generate(spec_path, cache)
+        cache.save()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cache = GenCache(cache_path) if cache_path else None
+        outputs = generate(spec_path, cache, jobs=jobs)
+        best = min(best, time.perf_counter() - start)
+    return best, sum(len(content) for content in outputs.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spec", type=Path, help="path to webgpu.json")
+    parser.add_argument("--scale", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scaled_path = Path(tmp) / "webgpu_scaled.json"
+        scaled_path.write_text(
+            json.dumps(scale_spec(json.loads(args.spec.read_text()), args.scale))
+        )
+        for label, path in [
+            (args.spec.name, args.spec),
+            (f"{args.spec.name} x{args.scale}", scaled_path),
+        ]:
+            for mode, cache_path in [
+                ("cold", None),
+                ("warm cache", Path(tmp) / path.stem / "sections.json"),
+            ]:
+                seconds, size = bench(path, args.repeat, args.jobs, cache_path)
+                print(
+                    f"{label:>20} {mode:>10}: {seconds * 1000:8.2f} ms"
+                    f"  ({size / 1024:.0f} KiB, {size / seconds / 2**20:.1f} MiB/s)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
+import argparse
 import enum
+import hashlib
 import json
 import math
+import pickle
+import re
+import subprocess
 import sys
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields, replace
+from functools import lru_cache
+from io import StringIO
 from itertools import filterfalse, tee
 from pathlib import Path
-from types import SimpleNamespace
-from typing import Optional
+from textwrap import dedent, indent
+from typing import Optional, TextIO
 
 
 def partition(predicate, iterable):
@@ -19,49 +27,111 @@ def partition(predicate, iterable):
     return filterfalse(predicate, t1), filter(predicate, t2)
 
 
-@dataclass
+class SpecError(ValueError):
+    """Raised when webgpu.json does not match the shape gen_c.py expects."""
+
+
+@lru_cache(maxsize=None)
+def _field_names(cls) -> frozenset[str]:
+    return frozenset(f.name for f in fields(cls))
+
+
+def _fields(cls, data: dict, path: str, required: tuple[str, ...]) -> dict:
+    if not isinstance(data, dict):
+        raise SpecError(f"{path}: expected an object, got {type(data).__name__}")
+    unknown = data.keys() - _field_names(cls)
+    if unknown:
+        raise SpecError(f"{path}: unknown keys {sorted(unknown)}")
+    missing = [key for key in required if key not in data]
+    if missing:
+        raise SpecError(f"{path}: missing keys {missing}")
+    return data
+
+
+def _entries(cls, data: dict, key: str, path: str) -> tuple:
+    return tuple(
+        cls.from_json(entry, f"{path}.{key}[{i}]")
+        for i, entry in enumerate(data.get(key, []))
+    )
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Constant:
     name: str
     value: str
     doc: str
 
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "Constant":
+        _fields(cls, data, path, ("name", "value", "doc"))
+        return cls(**data)
+
 
-@dataclass
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Typedef:
     name: str
     doc: str
     type: str
 
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "Typedef":
+        _fields(cls, data, path, ("name", "doc", "type"))
+        return cls(**data)
 
-@dataclass
+
+@dataclass(frozen=True, slots=True, kw_only=True)
 class EnumEntry:
     name: str
     doc: str
-    value: Optional[str]
+    value: Optional[int] = None
+
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "EnumEntry":
+        _fields(cls, data, path, ("name", "doc"))
+        return cls(**data)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Enum:
     name: str
     doc: str
-    entries: list[EnumEntry]
-    extended: bool
+    entries: tuple[EnumEntry, ...]
+    extended: bool = False
+
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "Enum":
+        _fields(cls, data, path, ("name", "doc"))
+        return cls(**{**data, "entries": _entries(EnumEntry, data, "entries", path)})
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, kw_only=True)
 class BitflagEntry:
     name: str
     doc: str
-    value: str
-    value_combination: list[str]
+    value: Optional[int] = None
+    value_combination: tuple[str, ...] = ()
+
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "BitflagEntry":
+        _fields(cls, data, path, ("name", "doc"))
+        return cls(
+            **{**data, "value_combination": tuple(data.get("value_combination", ()))}
+        )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Bitflag:
     name: str
     doc: str
-    entries: list[BitflagEntry]
-    extended: bool
+    entries: tuple[BitflagEntry, ...]
+    extended: bool = False
+
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "Bitflag":
+        _fields(cls, data, path, ("name", "doc"))
+        return cls(
+            **{**data, "entries": _entries(BitflagEntry, data, "entries", path)}
+        )
 
 
 class PointerType(enum.StrEnum):
@@ -69,157 +139,413 @@ class PointerType(enum.StrEnum):
     IMMUTABLE = "immutable"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, kw_only=True)
 class ParameterType:
-    name: str
+    # return types have no name
+    name: str = ""
     doc: str
     type: str
-    pointer: Optional[PointerType]
-    optional: bool
+    pointer: Optional[PointerType] = None
+    optional: bool = False
+
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "ParameterType":
+        _fields(cls, data, path, ("doc", "type"))
+        try:
+            pointer = PointerType(data["pointer"]) if "pointer" in data else None
+        except ValueError:
+            raise SpecError(f"{path}: invalid pointer {data['pointer']!r}") from None
+        return cls(**{**data, "pointer": pointer})
+
+    @property
+    def is_array(self) -> bool:
+        return self.type.startswith("array<")
+
+    @property
+    def element_type(self) -> str:
+        """The type without any `array<...>` wrapper."""
+        return self.type.removeprefix("array<").removesuffix(">")
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Callback:
     name: str
     doc: str
     style: str
-    args: list[ParameterType]
+    args: tuple[ParameterType, ...] = ()
 
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "Callback":
+        _fields(cls, data, path, ("name", "doc", "style"))
+        return cls(**{**data, "args": _entries(ParameterType, data, "args", path)})
 
-@dataclass
+
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Function:
     name: str
     doc: str
-    returns: ParameterType
-    args: list[ParameterType]
-    returns_async: list[ParameterType]
+    returns: Optional[ParameterType] = None
+    args: tuple[ParameterType, ...] = ()
+    returns_async: Optional[tuple[ParameterType, ...]] = None
+
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "Function":
+        _fields(cls, data, path, ("name", "doc"))
+        return cls(
+            **{
+                **data,
+                "returns": (
+                    ParameterType.from_json(data["returns"], f"{path}.returns")
+                    if "returns" in data
+                    else None
+                ),
+                "args": _entries(ParameterType, data, "args", path),
+                "returns_async": (
+                    _entries(ParameterType, data, "returns_async", path)
+                    if "returns_async" in data
+                    else None
+                ),
+            }
+        )
+
+
+class StructType(enum.StrEnum):
+    BASE_IN = "base_in"
+    BASE_OUT = "base_out"
+    EXTENSION_IN = "extension_in"
+    EXTENSION_OUT = "extension_out"
+    STANDALONE = "standalone"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Struct:
     name: str
-    type: str
+    type: StructType
     doc: str
-    free_members: bool
-    members: list[ParameterType]
+    free_members: bool = False
+    members: tuple[ParameterType, ...] = ()
+    extends: tuple[str, ...] = ()
+
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "Struct":
+        _fields(cls, data, path, ("name", "type", "doc"))
+        try:
+            struct_type = StructType(data["type"])
+        except ValueError:
+            raise SpecError(f"{path}: invalid struct type {data['type']!r}") from None
+        return cls(
+            **{
+                **data,
+                "type": struct_type,
+                "members": _entries(ParameterType, data, "members", path),
+                "extends": tuple(data.get("extends", ())),
+            }
+        )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Object:
     name: str
     doc: str
-    methods: list[Function]
-    extended: bool
-    namespace: str
-
-
-@dataclass
+    methods: tuple[Function, ...] = ()
+    extended: bool = False
+    namespace: str = ""
+
+    @classmethod
+    def from_json(cls, data: dict, path: str) -> "Object":
+        _fields(cls, data, path, ("name", "doc"))
+        return cls(**{**data, "methods": _entries(Function, data, "methods", path)})
+
+
+# prefix used in type references (`struct.limits`) for each kind of entry
+KINDS = {
+    "constants": "constant",
+    "typedefs": "typedef",
+    "enums": "enum",
+    "bitflags": "bitflag",
+    "structs": "struct",
+    "callbacks": "callback",
+    "function_types": "function_type",
+    "functions": "function",
+    "objects": "object",
+}
+
+BUILTIN_TYPES = {
+    "bool",
+    "c_void",
+    "float32",
+    "float64",
+    "int16",
+    "int32",
+    "int64",
+    "string",
+    "uint16",
+    "uint32",
+    "uint64",
+    "usize",
+}
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Spec:
     copyright: str
     name: str
     enum_prefix: str
-    constants: list[Constant]
+    constants: tuple[Constant, ...] = ()
     # currently empty
-    typedefs: list[Typedef]
-    enums: list[Enum]
-    bitflags: list[Bitflag]
-    structs: list[Struct]
-    callbacks: list[Callback]
-    functions: list[Function]
-    objects: list[Object]
-    function_types: list[Function]
-
-
-def load_spec(path: Path) -> Spec:
-    with open(path, "r") as f:
-        return json.load(f, object_hook=lambda d: SimpleNamespace(**d))
-
-
-def gen_enum(entry: Enum) -> str:
-    doc = (
-        ""
-        if entry.doc.strip() == "TODO"
-        else f"""\"\"\"\n    {entry.doc.strip()}\"\"\"\n"""
-    )
-    output = f"""
-@fieldwise_init
-@register_passable("trivial")
-struct {entry.name.title().replace("_", "")}(Copyable, Equatable, ImplicitlyCopyable, Movable, Writable):
-    {doc}
-    var value: UInt32
+    typedefs: tuple[Typedef, ...] = ()
+    enums: tuple[Enum, ...] = ()
+    bitflags: tuple[Bitflag, ...] = ()
+    structs: tuple[Struct, ...] = ()
+    callbacks: tuple[Callback, ...] = ()
+    functions: tuple[Function, ...] = ()
+    objects: tuple[Object, ...] = ()
+    function_types: tuple[Function, ...] = ()
+    # every named entry by its type reference, e.g. `index["struct.limits"]`
+    index: dict[str, object] = field(default_factory=dict, repr=False, compare=False)
+    # digest of each section's JSON, used to key the incremental cache
+    digests: dict[str, str] = field(default_factory=dict, repr=False, compare=False)
+
+    @classmethod
+    def from_json(cls, data: dict, path: str = "spec") -> "Spec":
+        _fields(cls, data, path, ("copyright", "name", "enum_prefix"))
+        derived = data.keys() & {"index", "digests"}
+        if derived:
+            raise SpecError(f"{path}: unknown keys {sorted(derived)}")
+        sections = {
+            key: _entries(entry_cls, data, key, path)
+            for key, entry_cls in [
+                ("constants", Constant),
+                ("typedefs", Typedef),
+                ("enums", Enum),
+                ("bitflags", Bitflag),
+                ("structs", Struct),
+                ("callbacks", Callback),
+                ("function_types", Function),
+                ("functions", Function),
+                ("objects", Object),
+            ]
+        }
+        index = {}
+        for key, entries in sections.items():
+            for entry in entries:
+                ref = f"{KINDS[key]}.{entry.name}"
+                if ref in index:
+                    raise SpecError(f"{path}.{key}: duplicate entry {ref!r}")
+                index[ref] = entry
+        digests = {
+            key: digest(json.dumps(data.get(key, []), sort_keys=True).encode())
+            for key in sections
+        }
+        spec = cls(**{**data, **sections, "index": index, "digests": digests})
+        spec.validate()
+        return spec
+
+    def parameters(self):
+        """Yield `(path, parameter)` for every parameter type in the spec."""
+        for struct in self.structs:
+            for member in struct.members:
+                yield f"struct.{struct.name}.{member.name}", member
+        for callback in self.callbacks:
+            for arg in callback.args:
+                yield f"callback.{callback.name}.{arg.name}", arg
+        for kind, functions in [
+            ("function_type", self.function_types),
+            ("function", self.functions),
+        ]:
+            for function in functions:
+                yield from _function_parameters(f"{kind}.{function.name}", function)
+        for obj in self.objects:
+            for method in obj.methods:
+                yield from _function_parameters(
+                    f"object.{obj.name}.{method.name}", method
+                )
+
+    def validate(self):
+        """Check that every type reference resolves to an entry of the spec."""
+        for path, param in self.parameters():
+            ty = param.element_type
+            # function types are only ever emitted as opaque pointers, and
+            # webgpu.json references some (uncaptured_error_callback_info)
+            # without declaring them
+            if ty.startswith("function_type."):
+                continue
+            if ty not in BUILTIN_TYPES and ty not in self.index:
+                raise SpecError(f"{path}: unknown type {param.type!r}")
+        for struct in self.structs:
+            for base in struct.extends:
+                if f"struct.{base}" not in self.index:
+                    raise SpecError(f"struct.{struct.name}: extends unknown {base!r}")
+
+
+def _function_parameters(path: str, function: Function):
+    if function.returns is not None:
+        yield f"{path}.returns", function.returns
+    for arg in function.args:
+        yield f"{path}.{arg.name}", arg
+    for arg in function.returns_async or ():
+        yield f"{path}.returns_async.{arg.name}", arg
+
+
+def load_spec(path: Path, cache_path: Optional[Path] = None) -> Spec:
+    """Load and validate the spec at `path`.
+
+    With `cache_path` the validated model is pickled there, keyed on the JSON
+    digest, and reused by later runs without parsing the JSON again.
+    """
+    data = path.read_bytes()
+    # the model classes live in this file, so a generator change invalidates too
+    key = digest(Path(__file__).read_bytes(), data)
+    if cache_path is not None:
+        try:
+            with open(cache_path, "rb") as f:
+                cached_key, spec = pickle.load(f)
+            if cached_key == key:
+                return spec
+        except (OSError, EOFError, AttributeError, ValueError, pickle.PickleError):
+            pass
+
+    spec = Spec.from_json(json.loads(data))
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, "wb") as f:
+            pickle.dump((key, spec), f, protocol=pickle.HIGHEST_PROTOCOL)
+    return spec
+
+
+class Emitter:
+    """Writes generated code straight to a text stream.
+
+    Lines are prefixed with the current indentation, so the generators below
+    never build up (and repeatedly copy) large intermediate strings.
+    """
 
-    fn __eq__(self, rhs: Self) -> Bool:
-        return self.value == rhs.value
-"""
-    for i, e in enumerate(entry.entries):
-        ename = e.name.lower()
-        if entry.name == "texture_view_dimension" or entry.name == "texture_dimension":
-            ename = ename[::-1]
-        output += (
-            f"    comptime {ename} = Self({e.value if hasattr(e, 'value') else i})\n"
-        )
-        if e.doc.strip() != "TODO":
-            output += f'    """{e.doc.strip()}"""\n'
-    output += """\n    fn write_to(self, mut w: Some[Writer]):\n"""
-    for i, e in enumerate(entry.entries):
-        ename = e.name.lower()
-        if entry.name == "texture_view_dimension" or entry.name == "texture_dimension":
-            ename = ename[::-1]
-        output += f"""
-        {"" if i == 0 else "el"}if self == Self.{ename}:
-            w.write("{ename}")
-"""
+    INDENT = "    "
 
-    return output
+    def __init__(self, stream: TextIO):
+        self.write = stream.write
+        self.prefix = ""
 
+    def line(self, text: str = ""):
+        self.write(f"{self.prefix}{text}\n" if text else "\n")
 
-def gen_bitflag(entry: Bitflag) -> str:
-    doc = (
-        ""
-        if entry.doc.strip() == "TODO"
-        else f"""\"\"\"\n    {entry.doc.strip()}\"\"\"\n"""
-    )
-    output = f"""
-@fieldwise_init
-@register_passable("trivial")
-struct {entry.name.title().replace("_", "")}(Copyable, Equatable, ImplicitlyCopyable, Movable):
-    {doc}
-    var value: UInt32
+    def lines(self, *texts: str):
+        prefix = self.prefix
+        self.write("".join([f"{prefix}{text}\n" if text else "\n" for text in texts]))
 
-    fn __eq__(self, rhs: Self) -> Bool:
-        return self.value == rhs.value
+    def block(self, text: str):
+        self.write(indent_block(text, self.prefix))
 
-    fn __ne__(self, rhs: Self) -> Bool:
-        return self.value != rhs.value
+    def indented(self) -> "Emitter":
+        """Indent everything written inside `with out.indented():` one level."""
+        self.prefix += self.INDENT
+        return self
 
-    fn __xor__(self, rhs: Self) -> Self:
-        return Self(self.value ^ rhs.value)
+    def __enter__(self) -> "Emitter":
+        return self
 
-    fn __and__(self, rhs: Self) -> Self:
-        return Self(self.value & rhs.value)
+    def __exit__(self, *exc_info):
+        self.prefix = self.prefix[: -len(self.INDENT)]
 
-    fn __or__(self, rhs: Self) -> Self:
-        return Self(self.value | rhs.value)
 
-    fn __invert__(self) -> Self:
-        return Self(~self.value)
+@lru_cache(maxsize=None)
+def indent_block(text: str, prefix: str) -> str:
+    return indent(dedent(text).strip("\n"), prefix) + "\n"
 
-"""
-    for i, e in enumerate(entry.entries):
-        if hasattr(e, "value_combination"):
-            combination = " | ".join(f"Self.{val}" for val in e.value_combination)
-            output += f"    comptime {e.name.lower()} = {combination}\n"
-        else:
-            output += (
-                f"    comptime {e.name.lower()} ="
-                f" Self({int(math.pow(2, int(e.value) if hasattr(e, 'value') else i - 1))})\n"
-            )
-        if e.doc.strip() != "TODO":
-            output += f'    """{e.doc.strip()}"""\n'
-    return output
 
+def doc_text(doc: str) -> Optional[str]:
+    doc = doc.strip()
+    return None if doc == "TODO" else doc
+
+
+def enum_entry_name(entry: Enum, e: EnumEntry) -> str:
+    ename = e.name.lower()
+    if entry.name == "texture_view_dimension" or entry.name == "texture_dimension":
+        ename = ename[::-1]
+    return ename
+
+
+def gen_enum(out: Emitter, entry: Enum):
+    out.lines(
+        "",
+        "@fieldwise_init",
+        '@register_passable("trivial")',
+        f"struct {entry.name.title().replace('_', '')}(Copyable, Equatable, ImplicitlyCopyable, Movable, Writable):",
+    )
+    with out.indented():
+        if (doc := doc_text(entry.doc)) is not None:
+            out.lines('"""', f'{doc}"""')
+        out.block(
+            """
+            var value: UInt32
+
+            fn __eq__(self, rhs: Self) -> Bool:
+                return self.value == rhs.value
+            """
+        )
+        values = []
+        cases = []
+        for i, e in enumerate(entry.entries):
+            ename = enum_entry_name(entry, e)
+            values.append(f"comptime {ename} = Self({e.value if e.value is not None else i})")
+            if (doc := doc_text(e.doc)) is not None:
+                values.append(f'"""{doc}"""')
+            cases.append("")
+            cases.append(f"{'' if i == 0 else 'el'}if self == Self.{ename}:")
+            cases.append(f'    w.write("{ename}")')
+        out.lines(*values, "", "fn write_to(self, mut w: Some[Writer]):")
+        with out.indented():
+            out.lines(*cases)
+
+
+def gen_bitflag(out: Emitter, entry: Bitflag):
+    out.lines(
+        "",
+        "@fieldwise_init",
+        '@register_passable("trivial")',
+        f"struct {entry.name.title().replace('_', '')}(Copyable, Equatable, ImplicitlyCopyable, Movable):",
+    )
+    with out.indented():
+        if (doc := doc_text(entry.doc)) is not None:
+            out.lines('"""', f'{doc}"""')
+        out.block(
+            """
+            var value: UInt32
+
+            fn __eq__(self, rhs: Self) -> Bool:
+                return self.value == rhs.value
+
+            fn __ne__(self, rhs: Self) -> Bool:
+                return self.value != rhs.value
+
+            fn __xor__(self, rhs: Self) -> Self:
+                return Self(self.value ^ rhs.value)
 
-def gen_constant(entry: Constant) -> str:
+            fn __and__(self, rhs: Self) -> Self:
+                return Self(self.value & rhs.value)
+
+            fn __or__(self, rhs: Self) -> Self:
+                return Self(self.value | rhs.value)
+
+            fn __invert__(self) -> Self:
+                return Self(~self.value)
+            """
+        )
+        out.line()
+        for i, e in enumerate(entry.entries):
+            if e.value_combination:
+                combination = " | ".join(f"Self.{val}" for val in e.value_combination)
+                out.line(f"comptime {e.name.lower()} = {combination}")
+            else:
+                out.line(
+                    f"comptime {e.name.lower()} ="
+                    f" Self({int(math.pow(2, e.value if e.value is not None else i - 1))})"
+                )
+            if (doc := doc_text(e.doc)) is not None:
+                out.line(f'"""{doc}"""')
+
+
+def gen_constant(out: Emitter, entry: Constant):
     match entry.value:
         case "uint32_max":
             val = "UInt32.MAX"
@@ -230,15 +556,11 @@ def gen_constant(entry: Constant) -> str:
         case _:
             val = entry.value
 
-    doc = (
-        ""
-        if entry.doc.strip() == "TODO"
-        else f"""\"\"\"\n{entry.doc.strip()}\"\"\"\n"""
-    )
-    return f"""
-comptime {entry.name.upper()} = {val}
-{doc}
-"""
+    out.line()
+    out.line(f"comptime {entry.name.upper()} = {val}")
+    if (doc := doc_text(entry.doc)) is not None:
+        out.lines('"""', f'{doc}"""')
+    out.line()
 
 
 def sanitize_name(
@@ -312,10 +634,10 @@ def gen_parameter_type(
         struct_pointer=struct_pointer,
         with_origin=with_origin,
     )
-    if hasattr(entry, "pointer"):
-        if "array<" in entry.type:
+    if entry.pointer is not None:
+        if entry.is_array:
             ty = sanitize_name(
-                entry.type.removeprefix("array<").removesuffix(">"),
+                entry.element_type,
                 object_pointer=object_pointer,
                 struct_pointer=struct_pointer,
                 with_origin=with_origin,
@@ -329,28 +651,29 @@ def gen_parameter_type(
             ty = f"{ty}"
 
     if type_only:
-        if in_function and entry.type.startswith("array<"):
+        if in_function and entry.is_array:
             return f"Int32, {ty}"
         return ty
     res = f"""{entry.name}: {ty}"""
-    if in_function and entry.type.startswith("array<"):
+    if in_function and entry.is_array:
         res = (
             f"{entry.name[:-1]}_count:"
-            f" Int{' = Int()' if hasattr(entry, 'optional') else ''}, {res}"
+            f" Int{' = Int()' if entry.optional else ''}, {res}"
         )
-    if hasattr(entry, "optional") and default_assign:
+    if entry.optional and default_assign:
         res = f"{res} = {{}}"
     return res
 
 
 def gen_function(
+    out: Emitter,
     entry: Function,
     contains_self: bool = False,
     type: Optional[str] = None,
     prefix: Optional[str] = None,
-) -> str:
-    args = entry.args if hasattr(entry, "args") else []
-    args_ordered = partition(lambda x: hasattr(x, "optional"), args)
+):
+    args = entry.args
+    args_ordered = partition(lambda x: x.optional, args)
     params_pre_opt = ", ".join(
         gen_parameter_type(
             e,
@@ -372,20 +695,8 @@ def gen_function(
         for e in args_ordered[1]
     )
 
-    if hasattr(entry, "returns_async"):
+    if entry.returns_async is not None:
         ret_async = entry.returns_async
-        cb_params = ", ".join(
-            gen_parameter_type(
-                e,
-                default_assign=True,
-                type_only=True,
-                struct_pointer=True,
-                in_function=True,
-                with_origin=True,
-            )
-            for e in ret_async
-        )
-        cb_params += ", FFIPointer[NoneType, mut=True]"
         cb_params_arg = ", ".join(
             gen_parameter_type(
                 e,
@@ -417,14 +728,14 @@ def gen_function(
 
     if contains_self:
         params = f"handle: WGPU{type}, {params}"
-    try:
+    if entry.returns is not None:
         ret = gen_parameter_type(
             entry.returns, type_only=True, object_pointer=True, with_origin=True
         )
-    except:
+    else:
         ret = "None"
     arg_names = [
-        [f"{e.name[:-1]}_count", e.name] if e.type.startswith("array<") else [e.name]
+        [f"{e.name[:-1]}_count", e.name] if e.is_array else [e.name]
         for e in args
     ]
     arg_names = [arg for arg_item in arg_names for arg in arg_item]
@@ -435,138 +746,297 @@ def gen_function(
         arg_names.append("user_data")
     call_args = ", ".join(arg_names)
     types = ", ".join(f"type_of({arg})" for arg in arg_names)
-    doc = (
-        ""
-        if entry.doc.strip() == "TODO"
-        else f"""\"\"\"\n    {entry.doc.strip()}\"\"\"\n"""
-    )
-    return f"""
-fn {prefix + "_" if prefix else ""}{entry.name}({params}) -> {ret}:
-    {doc}
-    {"return" if ret != "None" else "_ = "} external_call["wgpu{type or ""}{entry.name.title().replace("_", "")}", {ret if ret != "None" else "NoneType"}, {types}]({call_args})
-"""
 
+    out.line()
+    out.line(f"fn {prefix + '_' if prefix else ''}{entry.name}({params}) -> {ret}:")
+    with out.indented():
+        if (doc := doc_text(entry.doc)) is not None:
+            out.lines('"""', f'{doc}"""')
+        out.line(
+            f"{'return' if ret != 'None' else '_ ='} external_call[\"wgpu{type or ''}{entry.name.title().replace('_', '')}\", {ret if ret != 'None' else 'NoneType'}, {types}]({call_args})"
+        )
 
-def gen_callback(entry: Callback):
-    args = entry.args if hasattr(entry, "args") else []
-    params_no_default = ", ".join(
-        gen_parameter_type(e, type_only=True, in_function=True) for e in args
-    )
-    return f"\ncomptime {entry.name}_callback = fn({params_no_default}) -> None\n"
+    if any(e.is_array for e in args):
+        gen_span_overload(
+            out, entry, f"{prefix + '_' if prefix else ''}{entry.name}", type, ret
+        )
+    if ret_async:
+        gen_future_overload(
+            out, entry, f"{prefix + '_' if prefix else ''}{entry.name}", type
+        )
 
 
-def gen_object(entry: Object) -> str:
-    name = entry.name.title().replace("_", "")
-    output = f"""
-struct _{name}Impl:
-    pass
-comptime WGPU{name} = FFIPointer[_{name}Impl, mut=True]
+def span_type(entry: ParameterType) -> str:
+    """`Span` of the C-layout elements of an `array<>` parameter."""
+    return f"Span[{sanitize_name(entry.element_type, with_origin=True)}]"
 
-fn {entry.name}_release(handle: WGPU{name}):
-    _ = external_call["wgpu{name}Release", NoneType, type_of(handle)](handle)
-"""
-    for method in entry.methods:
-        output += gen_function(method, type=name, contains_self=True, prefix=entry.name)
-    return output
 
+def spans_supported(params: tuple[ParameterType, ...]) -> bool:
+    # a `Span` only hands out pointers of its own mutability, so arrays the C
+    # side writes into keep their (count, pointer) form
+    return all(e.pointer != PointerType.MUTABLE for e in params if e.is_array)
 
-def gen_struct(entry: Struct) -> str:
-    doc = (
-        ""
-        if entry.doc.strip() == "TODO"
-        else f"""    \"\"\"\n    {entry.doc.strip()}\n    \"\"\"\n"""
-    )
-    output = f"""
-struct WGPU{entry.name.title().replace("_", "")}(Copyable, ImplicitlyCopyable, Movable):
-{doc}"""
-    if entry.type == "base_in":
-        output += "    var next_in_chain: FFIPointer[ChainedStruct, mut=True]\n"
-    elif entry.type == "base_out":
-        output += "    var next_in_chain: FFIPointer[ChainedStructOut, mut=True]\n"
-    elif entry.type == "extension_in":
-        output += "    var chain: ChainedStruct\n"
-    elif entry.type == "extension_out":
-        output += "    var chain: ChainedStructOut\n"
-    members = entry.members if hasattr(entry, "members") else []
-    for member in members:
-        if member.type.startswith("function_type."):
-            output += f"    var {member.name}: FFIPointer[NoneType, mut=True]\n"
-        elif member.type.startswith("array<"):
-            output += f"    var {member.name[:-1]}_count: Int\n"
-            output += (
-                "    var"
-                f" {gen_parameter_type(member, struct_pointer=False, with_origin=True)}\n"
-            )
+
+def gen_span_overload(
+    out: Emitter, entry: Function, name: str, type: Optional[str], ret: str
+):
+    """Emit an overload of `name` taking a `Span` for each `array<>` argument.
+
+    The span's pointer and length are passed straight through, so callers that
+    already hold C-layout elements do not need to copy them into a `List`.
+    """
+    if entry.returns_async is not None or not spans_supported(entry.args):
+        return
+    required, optional = partition(lambda x: x.optional, entry.args)
+    params = [f"handle: WGPU{type}"] if type else []
+    call_args = ["handle"] if type else []
+    for e in [*required, *optional]:
+        if e.is_array:
+            params.append(f"{e.name}: {span_type(e)}{' = {}' if e.optional else ''}")
+            call_args += [f"len({e.name})", f"{e.name}.unsafe_ptr()"]
         else:
-            output += (
-                "    var"
-                f" {gen_parameter_type(member, struct_pointer=hasattr(member, 'pointer'), with_origin=True)}\n"
+            params.append(
+                gen_parameter_type(
+                    e,
+                    default_assign=True,
+                    in_function=True,
+                    struct_pointer=True,
+                    with_origin=True,
+                )
             )
-    output += "\n    fn __init__(out self,\n"
-    if entry.type == "base_in":
-        output += "        next_in_chain: FFIPointer[ChainedStruct, mut=True] = {},\n"
-    elif entry.type == "base_out":
-        output += (
-            "        next_in_chain: FFIPointer[ChainedStructOut, mut=True] = {},\n"
+            call_args.append(e.name)
+
+    out.line()
+    out.line(f"fn {name}(")
+    with out.indented():
+        out.lines(*(f"{param}," for param in params))
+    out.line(f") -> {ret}:")
+    with out.indented():
+        out.line(
+            f"{'return ' if ret != 'None' else ''}{name}({', '.join(call_args)})"
         )
-    elif entry.type == "extension_in":
-        output += "        chain: ChainedStruct = {},\n"
-    elif entry.type == "extension_out":
-        output += "        chain: ChainedStructOut = {}\n"
-    for member in members:
-        if member.type.startswith("enum.") or member.type.startswith("bitflag."):
-            ty = gen_parameter_type(member, type_only=True, with_origin=True)
-            output += f"\n        {member.name}: {ty} = {ty}(0),\n"
-        elif member.type == "bool":
-            output += f"\n        {member.name}: Bool = False,"
-        elif member.type.startswith("function_type."):
-            output += (
-                f"\n        {member.name}: FFIPointer[NoneType, mut=True] = {{}},\n"
+
+
+def future_result_field(entry: ParameterType) -> tuple[str, str]:
+    """The `Result` field type for a callback argument, and how to fill it.
+
+    Strings and structs are only valid for the duration of the callback, so
+    they are copied out; a struct copy is shallow.
+    """
+    if entry.type == "string":
+        return (
+            "String",
+            f"String({entry.name}.unsafe_ptr()) if {entry.name} else String()",
+        )
+    if entry.type.startswith("struct.") and entry.pointer is not None:
+        ty = sanitize_name(entry.type)
+        return ty, f"{entry.name}.unsafe_ptr()[] if {entry.name} else {ty}()"
+    return sanitize_name(entry.type), entry.name
+
+
+def gen_future_overload(
+    out: Emitter, entry: Function, name: str, type: Optional[str]
+):
+    """Emit an overload of `name` that returns a `Future` instead of taking a
+    callback and `user_data`.
+
+    Every `returns_async` function gets the same three pieces: a `Result`
+    struct holding the callback's arguments, a callback storing one into the
+    future's state, and the overload passing both to `name`.
+    """
+    result = name.title().replace("_", "") + "Result"
+    fields = [future_result_field(e) for e in entry.returns_async]
+    required, optional = map(list, partition(lambda x: x.optional, entry.args))
+    params = [f"handle: WGPU{type}"] if type else []
+    params += [
+        gen_parameter_type(
+            e,
+            default_assign=True,
+            in_function=True,
+            struct_pointer=True,
+            with_origin=True,
+        )
+        for e in [*required, *optional]
+    ]
+    # the callback overload takes the callback between required and optional
+    # arguments
+    call_args = ["handle"] if type else []
+    for e in required:
+        call_args += [f"{e.name[:-1]}_count", e.name] if e.is_array else [e.name]
+    call_args += [f"_{name}_callback", "future.user_data()"]
+    for e in optional:
+        call_args += [f"{e.name[:-1]}_count", e.name] if e.is_array else [e.name]
+
+    out.line()
+    out.line("@fieldwise_init")
+    out.line(f"struct {result}(Copyable, Movable):")
+    with out.indented():
+        out.lines(
+            *(
+                f"var {e.name}: {ty}"
+                for e, (ty, _) in zip(entry.returns_async, fields)
             )
-        elif member.type.startswith("array<"):
+        )
+    out.line()
+    out.line(f"fn _{name}_callback(")
+    with out.indented():
+        out.lines(
+            *(
+                gen_parameter_type(
+                    e, in_function=True, struct_pointer=True, with_origin=True
+                )
+                + ","
+                for e in entry.returns_async
+            ),
+            "user_data: FFIPointer[NoneType, mut=True],",
+        )
+    out.line("):")
+    with out.indented():
+        values = ", ".join(value for _, value in fields)
+        out.line(f"FutureState[{result}].set(user_data, {result}({values}))")
+        out.line(f"FutureState[{result}].release(user_data)")
+    out.line()
+    out.line(f"fn {name}(")
+    with out.indented():
+        out.lines(*(f"{param}," for param in params))
+    out.line(f") -> Future[{result}]:")
+    with out.indented():
+        out.lines(
+            f"var future = Future[{result}]()",
+            f"{name}({', '.join(call_args)})",
+            "return future^",
+        )
+
+
+def gen_callback(out: Emitter, entry: Callback):
+    args = entry.args
+    params_no_default = ", ".join(
+        gen_parameter_type(e, type_only=True, in_function=True) for e in args
+    )
+    out.line()
+    out.line(f"comptime {entry.name}_callback = fn({params_no_default}) -> None")
+
+
+def gen_object(out: Emitter, entry: Object):
+    name = entry.name.title().replace("_", "")
+    out.line()
+    out.block(
+        f"""
+        struct _{name}Impl:
+            pass
+        comptime WGPU{name} = FFIPointer[_{name}Impl, mut=True]
+
+        fn {entry.name}_release(handle: WGPU{name}):
+            _ = external_call["wgpu{name}Release", NoneType, type_of(handle)](handle)
+        """
+    )
+    for method in entry.methods:
+        gen_function(out, method, type=name, contains_self=True, prefix=entry.name)
+
+
+def gen_struct(out: Emitter, entry: Struct):
+    chain = {
+        "base_in": ("next_in_chain", "FFIPointer[ChainedStruct, mut=True]"),
+        "base_out": ("next_in_chain", "FFIPointer[ChainedStructOut, mut=True]"),
+        "extension_in": ("chain", "ChainedStruct"),
+        "extension_out": ("chain", "ChainedStructOut"),
+    }.get(entry.type)
+    fields = []
+    params = []
+    assigns = []
+    # the overload taking a `Span` for each array member
+    span_params = []
+    span_assigns = []
+    if chain:
+        chain_name, chain_type = chain
+        fields.append(f"var {chain_name}: {chain_type}")
+        params.append(f"{chain_name}: {chain_type} = {{}},")
+        assigns.append(f"self.{chain_name} = {chain_name}")
+
+    members = entry.members
+    for member in members:
+        if member.type.startswith("function_type."):
+            fields.append(f"var {member.name}: FFIPointer[NoneType, mut=True]")
+            params.append(f"{member.name}: FFIPointer[NoneType, mut=True] = {{}},")
+        elif member.is_array:
             ty = gen_parameter_type(
                 member, type_only=True, struct_pointer=False, with_origin=True
             )
-            output += f"\n        {member.name[:-1]}_count: Int = Int(),\n"
-            output += f"\n        {member.name}: {ty} = {{}},\n"
+            fields.append(f"var {member.name[:-1]}_count: Int")
+            fields.append(f"var {member.name}: {ty}")
+            params.append(f"{member.name[:-1]}_count: Int = Int(),")
+            params.append(f"{member.name}: {ty} = {{}},")
+            assigns.append(f"self.{member.name[:-1]}_count = {member.name[:-1]}_count")
+            assigns.append(f"self.{member.name} = {member.name}")
+            span_params.append(f"{member.name}: {span_type(member)},")
+            span_assigns.append(f"self.{member.name[:-1]}_count = len({member.name})")
+            span_assigns.append(f"self.{member.name} = {member.name}.unsafe_ptr()")
+            continue
         else:
             ty = gen_parameter_type(
                 member,
                 type_only=True,
-                struct_pointer=hasattr(member, "pointer"),
+                struct_pointer=member.pointer is not None,
                 with_origin=True,
             )
-            owned = (
-                "var "
-                if member.type.startswith("struct.") and not hasattr(member, "pointer")
-                else ""
-            )
-            output += f"\n        {owned}{member.name}: {ty} = {{}},\n"
-    output += "    ):\n"
-    if entry.type == "base_in":
-        output += "        self.next_in_chain = next_in_chain\n"
-    elif entry.type == "base_out":
-        output += "        self.next_in_chain = next_in_chain\n"
-    elif entry.type == "extension_in":
-        output += "        self.chain = chain\n"
-    elif entry.type == "extension_out":
-        output += "        self.chain = chain\n"
-    for member in members:
+            fields.append(f"var {member.name}: {ty}")
+            if member.type.startswith("enum.") or member.type.startswith("bitflag."):
+                ty = gen_parameter_type(member, type_only=True, with_origin=True)
+                params.append(f"{member.name}: {ty} = {ty}(0),")
+            elif member.type == "bool":
+                params.append(f"{member.name}: Bool = False,")
+            else:
+                owned = (
+                    "var "
+                    if member.type.startswith("struct.")
+                    and member.pointer is None
+                    else ""
+                )
+                params.append(f"{owned}{member.name}: {ty} = {{}},")
         take = (
             "^"
-            if member.type.startswith("struct") and not hasattr(member, "pointer")
+            if member.type.startswith("struct") and member.pointer is None
             else ""
         )
-        if member.type.startswith("array<"):
-            output += (
-                f"        self.{member.name[:-1]}_count = {member.name[:-1]}_count\n"
-            )
-        output += f"        self.{member.name} = {member.name}{take}\n"
-
-    return output
-
+        assigns.append(f"self.{member.name} = {member.name}{take}")
+        span_params.append(params[-1])
+        span_assigns.append(assigns[-1])
 
-def gen_function_type(entry: Function) -> str:
+    out.line()
+    out.line(
+        f"struct WGPU{entry.name.title().replace('_', '')}(Copyable, ImplicitlyCopyable, Movable):"
+    )
+    with out.indented():
+        if (doc := doc_text(entry.doc)) is not None:
+            out.lines('"""', doc, '"""')
+        out.lines(*fields)
+        out.line()
+        out.line("fn __init__(out self,")
+        with out.indented():
+            out.lines(*params)
+        out.line("):")
+        with out.indented():
+            out.lines(*assigns)
+
+        # output structs are filled in by wgpu, so they get no `Span` overload
+        if (
+            entry.type not in (StructType.BASE_OUT, StructType.EXTENSION_OUT)
+            and any(m.is_array for m in members)
+            and spans_supported(members)
+        ):
+            if chain:
+                span_params.insert(0, params[0])
+                span_assigns.insert(0, assigns[0])
+            out.line()
+            out.line("fn __init__(")
+            with out.indented():
+                out.lines("out self,", "*,", *span_params)
+            out.line("):")
+            with out.indented():
+                out.lines(*span_assigns)
+
+
+def gen_function_type(out: Emitter, entry: Function):
     cb_params_arg = ", ".join(
         gen_parameter_type(
             e,
@@ -578,17 +1048,13 @@ def gen_function_type(entry: Function) -> str:
         for e in entry.args
     )
     cb_params_arg += ", FFIPointer[NoneType, mut=True]"
-    return (
+    out.line(
         f"comptime {entry.name.title().replace('_', '')} = fn({cb_params_arg})"
-        " -> None\n"
+        " -> None"
     )
 
 
-if __name__ == "__main__":
-    spec_path = Path.cwd() / (sys.argv[1])
-    spec = load_spec(spec_path)
-    enums = "\n".join(gen_enum(e) for e in spec.enums)
-    enums += """
+WGPU_ENUMS = """
 
 # WGPU SPECIFIC ENUMS
 
@@ -696,11 +1162,9 @@ struct NativeTextureFormat(Copyable, ImplicitlyCopyable, Movable, Equatable):
     # From Features::TEXTURE_FORMAT_NV12
     comptime nv_12 = Self(0x00030007)
 """
-    with open("wgpu/enums.mojo", "w+") as f:
-        f.write(enums)
-    structs = "\n".join(gen_struct(e) for e in spec.structs)
-    bitflags = "\n".join(gen_bitflag(e) for e in spec.bitflags)
-    bitflags += """
+
+
+WGPU_BITFLAGS = """
 
 # WGPU SPECIFIC BITFLAGS
 
@@ -855,21 +1319,18 @@ struct NativeQueryType(Copyable, ImplicitlyCopyable, Movable, Equatable):
 
     comptime pipeline_statistics = Self(0x00030000)
 """
-    with open("wgpu/bitflags.mojo", "w+") as f:
-        f.write(bitflags)
-    constants = "\n".join(gen_constant(e) for e in spec.constants)
-    with open("wgpu/constants.mojo", "w+") as f:
-        f.write(constants)
-    functions = "\n".join(gen_function(e) for e in spec.functions)
-    objects = "\n".join(gen_object(e) for e in spec.objects)
-    function_types = "\n".join(gen_function_type(e) for e in spec.function_types)
-    output = """
-from ffpointer import FFIPointer
 
+
+CFFI_PRELUDE = """
+from ffipointer import FFIPointer
+
+from memory import Span
 from sys.ffi import external_call
 from .enums import *
 from .bitflags import *
 from .constants import *
+from .future import Future, FutureState
+import ._profile
 
 
 struct ChainedStruct(Copyable, ImplicitlyCopyable, Movable):
@@ -888,8 +1349,9 @@ struct ChainedStructOut(Copyable, ImplicitlyCopyable, Movable):
         self.next = next
         self.s_type = s_type
 """
-    output += "\n".join([objects, structs, functions, function_types])
-    output += """
+
+
+WGPU_DEFS = """
 
 # WGPU SPECIFIC DEFS
 
@@ -1478,5 +1940,451 @@ fn surface_capabilities_free_members(capabilities: FFIPointer[WGPUSurfaceCapabil
    external_call["wgpuSurfaceCapabilitiesFreeMembers", NoneType, type_of(capabilities)](capabilities)
 """
 
-    with open("wgpu/_cffi.mojo", "w+") as f:
-        f.write(output)
+
+# Each section is generated from a single top level list of the spec, so a
+# section only has to be regenerated when that list (or the generator) changes.
+SECTIONS = {
+    "enums": gen_enum,
+    "bitflags": gen_bitflag,
+    "constants": gen_constant,
+    "objects": gen_object,
+    "structs": gen_struct,
+    "functions": gen_function,
+    "function_types": gen_function_type,
+}
+
+
+def gen_section(out: Emitter, name: str, entries: list):
+    for i, entry in enumerate(entries):
+        if i:
+            out.write("\n")
+        SECTIONS[name](out, entry)
+
+
+# the files `assemble_outputs` writes, relative to the output directory
+OUTPUTS = [
+    "wgpu/enums.mojo",
+    "wgpu/bitflags.mojo",
+    "wgpu/constants.mojo",
+    "wgpu/_cffi.mojo",
+]
+
+
+EXTERNAL_CALL = re.compile(
+    r"^(?P<indent>[ \t]*)(?P<lead>return |_ = )?"
+    r'(?P<call>external_call\[\s*"(?P<symbol>\w+)")',
+    re.MULTILINE,
+)
+
+
+def instrument_calls(text: str) -> str:
+    """Bracket every `external_call` statement in `text` with `_profile` calls.
+
+    Each call site gets its own slot in the statistics table, numbered in
+    order. `_profile.start` and `_profile.record` compile to nothing unless
+    the program is built with `-D WGPU_PROFILE`.
+    """
+    out = []
+    pos = 0
+    for slot, match in enumerate(EXTERNAL_CALL.finditer(text)):
+        # the statement ends at the first newline outside of brackets
+        depth = 0
+        end = match.start("call")
+        while depth or text[end] != "\n":
+            depth += (text[end] in "([") - (text[end] in ")]")
+            end += 1
+        indent, lead, symbol = match.group("indent", "lead", "symbol")
+        call = text[match.start("call") : end]
+        returns = lead == "return "
+        out += [
+            text[pos : match.start()],
+            f"{indent}var start = _profile.start()\n",
+            f"{indent}{'var result' if returns else '_'} = {call}\n",
+            f'{indent}_profile.record[{slot}, "{symbol}"](start)',
+            f"\n{indent}return result" if returns else "",
+        ]
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def assemble_outputs(sections: dict[str, str]) -> dict[str, str]:
+    layout = {
+        "wgpu/enums.mojo": [sections["enums"], WGPU_ENUMS],
+        "wgpu/bitflags.mojo": [sections["bitflags"], WGPU_BITFLAGS],
+        "wgpu/constants.mojo": [sections["constants"]],
+        "wgpu/_cffi.mojo": [
+            CFFI_PRELUDE,
+            sections["objects"],
+            "\n",
+            sections["structs"],
+            "\n",
+            sections["functions"],
+            "\n",
+            sections["function_types"],
+            WGPU_DEFS,
+        ],
+    }
+    outputs = {path: "".join(parts) for path, parts in layout.items()}
+    outputs["wgpu/_cffi.mojo"] = instrument_calls(outputs["wgpu/_cffi.mojo"])
+    return outputs
+
+
+def digest(*parts: bytes) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def write_if_changed(path: Path, content: str) -> bool:
+    """Write `content` to `path` unless the file already holds exactly that.
+
+    Leaving identical files alone keeps their mtime, so downstream Mojo
+    builds are not invalidated by a no-op regeneration.
+    """
+    data = content.encode()
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.write_bytes(data)
+    return True
+
+
+class GenCache:
+    """Section texts and output digests from the previous incremental run."""
+
+    VERSION = 1
+
+    def __init__(self, path: Path):
+        self.path = path
+        # the validated spec model, pickled next to the section cache
+        self.spec_path = path.with_name("spec.pickle")
+        self.sections: dict[str, dict[str, str]] = {}
+        self.outputs: dict[str, dict[str, str]] = {}
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        if data.get("version") == self.VERSION:
+            self.sections = data["sections"]
+            self.outputs = data["outputs"]
+
+    def section(self, name: str, key: str) -> Optional[str]:
+        cached = self.sections.get(name)
+        if cached is not None and cached["key"] == key:
+            return cached["text"]
+        return None
+
+    def output_unchanged(self, path: Path, generated: str) -> bool:
+        """Whether `path` still holds what was written for `generated` last time.
+
+        The on disk digest is tracked separately from the generated one since
+        `mojo format` rewrites the files after they have been generated.
+        """
+        cached = self.outputs.get(str(path))
+        return (
+            cached is not None
+            and path.exists()
+            and cached["generated"] == digest(generated.encode())
+            and cached["on_disk"] == digest(path.read_bytes())
+        )
+
+    def record_output(self, path: Path, generated: str):
+        self.outputs[str(path)] = {
+            "generated": digest(generated.encode()),
+            "on_disk": digest(path.read_bytes()),
+        }
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            json.dumps(
+                {
+                    "version": self.VERSION,
+                    "sections": self.sections,
+                    "outputs": self.outputs,
+                }
+            )
+        )
+
+
+def symbol_names(spec: Spec) -> dict[str, str]:
+    """Map every name the bindings define to the spec node defining it.
+
+    Nodes are index references (`struct.limits`), plus `object.<name>.<method>`
+    for methods, which are kept or dropped individually.
+    """
+    names = {}
+    for ref in spec.index:
+        kind, name = ref.split(".", 1)
+        if kind == "object":
+            names[sanitize_name(ref)] = ref
+            names[f"{name}_release"] = ref
+        elif kind == "function":
+            names[name] = ref
+        elif kind == "constant":
+            names[name.upper()] = ref
+        else:
+            names[sanitize_name(ref)] = ref
+    functions = [(f"function.{f.name}", f.name, f) for f in spec.functions]
+    for obj in spec.objects:
+        for method in obj.methods:
+            ref = f"object.{obj.name}.{method.name}"
+            functions.append((ref, f"{obj.name}_{method.name}", method))
+    for ref, name, function in functions:
+        names[name] = ref
+        if function.returns_async is not None:
+            names[name.title().replace("_", "") + "Result"] = ref
+    return names
+
+
+def dependencies(spec: Spec) -> dict[str, set[str]]:
+    """The nodes each node's emitted code refers to."""
+    deps = {}
+    for obj in spec.objects:
+        for method in obj.methods:
+            deps[f"object.{obj.name}.{method.name}"] = {f"object.{obj.name}"}
+    for path, param in spec.parameters():
+        parts = path.split(".")
+        node = ".".join(parts[:3] if parts[0] == "object" else parts[:2])
+        if param.element_type in spec.index:
+            deps.setdefault(node, set()).add(param.element_type)
+    return deps
+
+
+IDENTIFIER = re.compile(r"\b[A-Za-z_][A-Za-z0-9_]*\b")
+# commented-out code would otherwise keep what it mentions alive
+COMMENT = re.compile(r"#.*")
+
+# hand-written code the generator always emits, scanned as extra roots
+PRELUDES = ["CFFI_PRELUDE", "WGPU_DEFS", "WGPU_ENUMS", "WGPU_BITFLAGS"]
+
+
+def is_output(path: Path) -> bool:
+    """Whether `path` is one of the generated `OUTPUTS`, wherever it lives."""
+    parts = path.resolve().parts
+    return any(parts[-len(out.parts) :] == out.parts for out in map(Path, OUTPUTS))
+
+
+def scan_roots(spec: Spec, paths: list[Path]) -> set[str]:
+    """Names of the bindings referenced by the Mojo sources under `paths`.
+
+    Generated outputs are skipped, since they reference everything, whichever
+    `--out-dir` the current run writes to.
+    """
+    names = symbol_names(spec)
+    texts = [globals()[name] for name in PRELUDES]
+    for path in paths:
+        files = sorted(path.rglob("*.mojo")) if path.is_dir() else [path]
+        texts += (f.read_text() for f in files if not is_output(f))
+    return {
+        ident
+        for text in texts
+        for ident in IDENTIFIER.findall(COMMENT.sub("", text))
+        if ident in names
+    }
+
+
+def prune(spec: Spec, roots: set[str]) -> Spec:
+    """The part of `spec` needed by `roots` and, transitively, by its entries.
+
+    `roots` are binding names (`device_poll`, `WGPULimits`, `TextureFormat`) or
+    spec references (`struct.limits`).
+    """
+    names = symbol_names(spec)
+    deps = dependencies(spec)
+    unknown = sorted(
+        root for root in roots if root not in names and root not in spec.index
+    )
+    if unknown:
+        raise SpecError(f"unknown root symbols {unknown}")
+
+    pending = [names.get(root, root) for root in roots]
+    keep = set()
+    while pending:
+        node = pending.pop()
+        if node not in keep:
+            keep.add(node)
+            pending.extend(deps.get(node, ()))
+
+    sections = {
+        key: tuple(
+            entry
+            for entry in getattr(spec, key)
+            if f"{KINDS[key]}.{entry.name}" in keep
+        )
+        for key in SECTIONS
+    }
+    sections["objects"] = tuple(
+        replace(
+            obj,
+            methods=tuple(
+                method
+                for method in obj.methods
+                if f"object.{obj.name}.{method.name}" in keep
+            ),
+        )
+        for obj in sections["objects"]
+    )
+    # the cache keys of a pruned section cover what was kept of it
+    digests = {
+        key: digest(
+            spec.digests[key].encode(), "\n".join(sorted(keep)).encode()
+        )
+        for key in spec.digests
+    }
+    return replace(
+        spec,
+        **sections,
+        index={ref: entry for ref, entry in spec.index.items() if ref in keep},
+        digests=digests,
+    )
+
+
+def render_section(name: str, entries: tuple) -> str:
+    stream = StringIO()
+    gen_section(Emitter(stream), name, entries)
+    return stream.getvalue()
+
+
+def generate(
+    spec_path: Path,
+    cache: Optional[GenCache] = None,
+    jobs: int = 1,
+    roots: Optional[set[str]] = None,
+) -> dict[str, str]:
+    """Generate every output file for the spec at `spec_path`.
+
+    With `jobs > 1` the sections that are not cached are rendered in a process
+    pool. Sections are independent of each other and are reassembled in a
+    fixed order, so the result is identical to a serial run.
+
+    With `roots` only what they transitively need is emitted, see `prune`.
+    """
+    spec = load_spec(spec_path, cache.spec_path if cache else None)
+    if roots is not None:
+        spec = prune(spec, roots)
+    generator_digest = digest(Path(__file__).read_bytes())
+
+    sections = {}
+    keys = {}
+    for name in SECTIONS:
+        keys[name] = digest(generator_digest.encode(), spec.digests[name].encode())
+        text = cache.section(name, keys[name]) if cache else None
+        if text is not None:
+            sections[name] = text
+
+    pending = [name for name in SECTIONS if name not in sections]
+    entries = [getattr(spec, name) for name in pending]
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            texts = list(pool.map(render_section, pending, entries))
+    else:
+        texts = list(map(render_section, pending, entries))
+    for name, text in zip(pending, texts):
+        sections[name] = text
+        if cache:
+            cache.sections[name] = {"key": keys[name], "text": text}
+    return assemble_outputs(sections)
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate the wgpu Mojo bindings.")
+    parser.add_argument("spec", type=Path, help="path to webgpu.json")
+    parser.add_argument(
+        "--out-dir",
+        type=Path,
+        default=Path.cwd(),
+        help="directory containing the `wgpu` package (default: cwd)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="reuse sections whose inputs are unchanged since the last run",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=None,
+        help="incremental cache file (default: <out-dir>/.gen_cache/sections.json)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes to generate sections with (default: 1)",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check that the --jobs output is byte-identical to a serial run, then exit",
+    )
+    parser.add_argument(
+        "--roots",
+        nargs="+",
+        default=[],
+        help="only emit these symbols and what they depend on",
+    )
+    parser.add_argument(
+        "--scan",
+        type=Path,
+        action="append",
+        default=[],
+        help="add the symbols referenced by the Mojo sources under this path to --roots",
+    )
+    parser.add_argument(
+        "--format",
+        action="store_true",
+        help="run `mojo format` on the files that were rewritten",
+    )
+    args = parser.parse_args(argv)
+
+    cache = None
+    if args.incremental:
+        cache = GenCache(args.cache or args.out_dir / ".gen_cache" / "sections.json")
+
+    roots = None
+    if args.roots or args.scan:
+        spec = load_spec(args.spec, cache.spec_path if cache else None)
+        names = symbol_names(spec)
+        unknown = [r for r in args.roots if r not in names and r not in spec.index]
+        if unknown:
+            parser.error(f"unknown --roots {unknown}")
+        roots = set(args.roots) | scan_roots(spec, args.scan)
+
+    if args.verify:
+        parallel = generate(args.spec, jobs=args.jobs, roots=roots)
+        serial = generate(args.spec, roots=roots)
+        mismatched = sorted(
+            rel_path
+            for rel_path in parallel.keys() | serial.keys()
+            if parallel.get(rel_path) != serial.get(rel_path)
+        )
+        if mismatched:
+            sys.exit(f"--jobs {args.jobs} output differs from a serial run: {mismatched}")
+        print(f"--jobs {args.jobs} output matches a serial run")
+        return
+
+    generated = generate(args.spec, cache, jobs=args.jobs, roots=roots)
+    outputs = {
+        args.out_dir / rel_path: content for rel_path, content in generated.items()
+    }
+    changed = [
+        path
+        for path, content in outputs.items()
+        if not (cache and cache.output_unchanged(path, content))
+        and write_if_changed(path, content)
+    ]
+    if args.format and changed:
+        subprocess.run(["mojo", "format", *map(str, changed)], check=True)
+    if cache:
+        for path, content in outputs.items():
+            cache.record_output(path, content)
+        cache.save()
+    for path in changed:
+        print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
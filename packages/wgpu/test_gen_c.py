@@ -0,0 +1,37 @@
+"""Tests for gen_c.py's pruning.
+
+    python -m pytest test_gen_c.py
+"""
+
+from pathlib import Path
+
+from gen_c import OUTPUTS, is_output, main
+
+HERE = Path(__file__).parent
+SPEC = HERE / "webgpu.json"
+
+
+def generate_into(out_dir: Path, *args: str) -> dict[str, str]:
+    (out_dir / "wgpu").mkdir(parents=True)
+    main([str(SPEC), "--out-dir", str(out_dir), *args])
+    return {path: (out_dir / path).read_text() for path in OUTPUTS}
+
+
+def test_is_output_matches_any_directory(tmp_path):
+    assert is_output(HERE / "wgpu" / "_cffi.mojo")
+    assert is_output(tmp_path / "wgpu" / "enums.mojo")
+    assert not is_output(HERE / "wgpu" / "objects.mojo")
+    assert not is_output(tmp_path / "_cffi.mojo")
+
+
+def test_scan_skips_checked_in_outputs_with_another_out_dir(tmp_path):
+    # Scanning the package directory must not let the checked-in bindings,
+    # which reference everything, keep every binding alive.
+    full = generate_into(tmp_path / "full")
+    pruned = generate_into(
+        tmp_path / "pruned",
+        *("--scan", str(HERE / "wgpu")),
+        *("--scan", str(HERE / "main.mojo")),
+    )
+    assert len(pruned["wgpu/_cffi.mojo"]) < len(full["wgpu/_cffi.mojo"])
+    assert "fn device_create_buffer(" in pruned["wgpu/_cffi.mojo"]